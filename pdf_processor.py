@@ -15,16 +15,66 @@ pages with meaningful content, reducing processing time by ~31% on typical docum
 """
 
 import io
+import os
+import hashlib
+import tempfile
 import logging
-from typing import List, Tuple, Optional
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterator, List, Tuple, Optional, Union
 from pathlib import Path
 
 import numpy as np
 import pypdfium2 as pdfium
 from PIL import Image
 
+# Optional: JIT-compiled tile variance kernel (falls back to NumPy if unavailable)
+try:
+    import numba
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+    
+    # The kernel is called from request/render threads, not just the main
+    # thread: prefer OpenMP, since a TBB pool started from a secondary thread
+    # hangs at interpreter exit (calls are serialized by _NUMBA_LOCK, which
+    # also keeps the non thread-safe workqueue fallback safe)
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Tile rows analyzed per step when blank detection is allowed to exit early
+EARLY_EXIT_BAND_ROWS = 8
+
+# Below this page count, process pool startup costs more than it saves
+PARALLEL_RENDER_MIN_PAGES = 4
+
+# Default cap on render processes: each one holds full-resolution pages in
+# memory, and rasterization stops scaling once memory bandwidth saturates
+MAX_RENDER_WORKERS = 4
+
+# Markdown horizontal rule placed between pages
+PAGE_SEPARATOR = "\n\n---\n\n"
+
+# Pages rendered per process pool task
+RENDER_CHUNK_PAGES = 4
+
+# Documents each render worker keeps open (one per concurrent pool render)
+WORKER_OPEN_DOCUMENTS = 2
+
+# Pages rendered ahead of the consumer when rendering in a background thread
+RENDER_PREFETCH_PAGES = 2
+
+# PDFium is not thread-safe, even across documents: every in-process PDFium
+# call (document open/close, page count, page render) holds this lock
+_PDFIUM_LOCK = threading.Lock()
+
+# Serializes calls to the parallel Numba kernel (see the numba import above)
+_NUMBA_LOCK = threading.Lock()
+
 
 class PDFProcessor:
     """
@@ -34,16 +84,40 @@ class PDFProcessor:
     ensuring license compliance for commercial use.
     """
     
-    def __init__(self, dpi: int = 200):
+    def __init__(
+        self,
+        dpi: int = 200,
+        render_workers: Optional[int] = None,
+        render_cache_bytes: int = 0
+    ):
         """
         Initialize PDF processor with rendering configuration.
         
         Args:
             dpi: Resolution for page rendering (200-300 is optimal for OCR)
                  Higher DPI = better quality but larger images and slower processing
+            render_workers: Processes used to render multi-page PDFs in parallel
+                           (default: CPU cores, at most MAX_RENDER_WORKERS;
+                           1 disables the pool)
+            render_cache_bytes: Memory budget for caching rendered pages of recently
+                               seen PDFs, keyed by content hash (default: 0, disabled)
         """
         self.dpi = dpi
-        logger.info(f"PDFProcessor initialized with DPI={dpi}")
+        if render_workers is None:
+            render_workers = min(os.cpu_count() or 1, MAX_RENDER_WORKERS)
+        self.render_workers = max(1, render_workers)
+        self._render_executor = None  # Process pool, started on first multi-page PDF
+        self._render_executor_lock = threading.Lock()
+        self._local_renders = 0  # Documents rendering in-process (guarded by the lock above)
+        self._scratch = threading.local()  # Per-thread reusable analysis buffers
+        self._render_cache = (
+            _RenderCache(render_cache_bytes) if render_cache_bytes > 0 else None
+        )
+        logger.info(
+            f"PDFProcessor initialized with DPI={dpi}, "
+            f"render_workers={self.render_workers}, "
+            f"render_cache={render_cache_bytes // (1024 * 1024)}MB"
+        )
     
     def pdf_to_images(
         self, 
@@ -51,8 +125,11 @@ class PDFProcessor:
         skip_blank: bool = True,
         tile_size: int = 64,
         variance_threshold: float = 100.0,
-        min_informative_tiles: int = 5
-    ) -> Tuple[List[Image.Image], List[int], List[dict]]:
+        min_informative_tiles: int = 5,
+        full_stats: bool = True,
+        max_size: Optional[int] = None,
+        as_array: bool = False
+    ) -> Tuple[List[Union[Image.Image, np.ndarray]], List[int], List[dict]]:
         """
         Converts a PDF document to a list of PIL Images (one per page).
         
@@ -60,16 +137,27 @@ class PDFProcessor:
         This reduces processing time by ~31% on typical documents by skipping pages
         without meaningful content.
         
+        Keeps every page with content in memory at once; use iter_pages() to
+        process pages one at a time.
+        
         Args:
             pdf_bytes: PDF file content as bytes
             skip_blank: If True, skip blank/uniform pages (default: True)
             tile_size: Tile size for ROI analysis (default: 64x64 pixels)
             variance_threshold: Variance threshold for informative tile (default: 100.0)
             min_informative_tiles: Minimum informative tiles required (default: 5)
+            full_stats: If False, stop each page scan as soon as it is known to have
+                        content (faster, partial tile statistics) (default: True)
+            max_size: If set, render each page directly at the largest size whose
+                      longest side fits max_size pixels (never above self.dpi), so no
+                      resize is needed before OCR (default: None, always self.dpi)
+            as_array: If True, return pages as read-only HxWx3 RGB NumPy arrays
+                      instead of PIL Images, without copying the rendered pixels
+                      (default: False)
             
         Returns:
             Tuple containing:
-                - List of PIL Images (RGB) for pages with content
+                - List of PIL Images (RGB) for pages with content (arrays if as_array)
                 - List of page numbers (1-indexed) that were processed
                 - List of statistics dictionaries for each analyzed page
         """
@@ -77,67 +165,336 @@ class PDFProcessor:
         page_numbers = []
         all_stats = []
         
+        for pil_image, page_number, stats in self.iter_pages(
+            pdf_bytes,
+            skip_blank=skip_blank,
+            tile_size=tile_size,
+            variance_threshold=variance_threshold,
+            min_informative_tiles=min_informative_tiles,
+            full_stats=full_stats,
+            max_size=max_size,
+            as_array=as_array
+        ):
+            if stats is not None:
+                all_stats.append(stats)
+            if pil_image is not None:
+                images.append(pil_image)
+                page_numbers.append(page_number)
+        
+        return images, page_numbers, all_stats
+    
+    def iter_pages(
+        self,
+        pdf_bytes: bytes,
+        skip_blank: bool = True,
+        tile_size: int = 64,
+        variance_threshold: float = 100.0,
+        min_informative_tiles: int = 5,
+        full_stats: bool = True,
+        max_size: Optional[int] = None,
+        as_array: bool = False
+    ) -> Iterator[Tuple[Optional[Union[Image.Image, np.ndarray]], int, Optional[dict]]]:
+        """
+        Renders and analyzes a PDF page by page, yielding each page as soon as it is ready.
+        
+        Streaming counterpart of pdf_to_images(): only the pages in flight are held
+        in memory, so callers can OCR and release each page before the next one
+        arrives. Arguments are the same as pdf_to_images().
+        
+        With the render cache enabled, every rendered page of an uncached
+        document is also held until the document ends (so it can be stored),
+        up to the budget shared by all in-flight documents: memory then grows
+        with page count, bounded by that budget.
+        
+        Pages are analyzed one at a time on purpose: the analysis of a page is
+        already a single vectorized pass over its tile grid, and stacking the
+        document into one (pages, height, width) array for a batched variance
+        would hold every page in memory and delay the first page until the
+        last one is rendered.
+        
+        Yields:
+            Tuple for every page of the document, in order:
+                - PIL Image (RGB) or read-only RGB array (as_array), or None if
+                  the page was skipped as blank
+                - Page number (1-indexed)
+                - Statistics dictionary, or None if skip_blank is False
+                
+        Raises:
+            ValueError: If the PDF cannot be processed
+        """
+        processed = 0
+        pdf = None
+        pages = None
+        
+        # scale = dpi / 72 (72 is default PDF DPI)
+        scale = self.dpi / 72.0
+        
+        # Rendered pages of recently seen documents are reused as-is
+        cache_key = None
+        cached_pages = None
+        to_cache = None
+        to_cache_bytes = 0
+        if self._render_cache is not None:
+            cache_key = (hashlib.blake2b(pdf_bytes, digest_size=16).digest(), scale, max_size)
+            cached_pages = self._render_cache.get(cache_key)
+        
         try:
-            # Use pypdfium2 (Apache 2.0 licensed, GPL-free)
-            pdf = pdfium.PdfDocument(pdf_bytes)
-            
-            total_pages = len(pdf)
-            logger.info(f"PDF loaded: {total_pages} pages")
+            if cached_pages is not None:
+                total_pages = len(cached_pages)
+                logger.info(f"PDF loaded from render cache: {total_pages} pages")
+                pages = (page for page in enumerate(cached_pages))
+            else:
+                # Use pypdfium2 (Apache 2.0 licensed, GPL-free)
+                with _PDFIUM_LOCK:
+                    pdf = pdfium.PdfDocument(pdf_bytes)
+                    total_pages = len(pdf)
+                logger.info(f"PDF loaded: {total_pages} pages")
+                
+                # Pages are rendered lazily (possibly in worker processes)
+                # and analyzed as they arrive
+                pages = self._render_pages(pdf, pdf_bytes, total_pages, scale, max_size)
+                if cache_key is not None:
+                    to_cache = []
             
-            for page_num in range(total_pages):
-                page = pdf[page_num]
+            for page_num, pixels in pages:
+                # Pages are rendered as RGB (model requires RGB), no conversion needed
+                assert pixels.ndim == 3 and pixels.shape[2] == 3, \
+                    f"Unexpected render layout {pixels.shape}"
                 
-                # Render page to image
-                # scale = dpi / 72 (72 is default PDF DPI)
-                scale = self.dpi / 72.0
-                pil_image = page.render(
-                    scale=scale,
-                    rotation=0,  # No rotation
-                ).to_pil()
+                logger.debug(f"Page {page_num + 1} rendered: {pixels.shape[1]}x{pixels.shape[0]}")
                 
-                # Convert to RGB if necessary (model requires RGB)
-                if pil_image.mode != 'RGB':
-                    pil_image = pil_image.convert('RGB')
+                if to_cache is not None:
+                    # Held pages are reserved from a budget shared by all
+                    # documents being rendered: give up caching when it is spent
+                    if self._render_cache.reserve(pixels.nbytes):
+                        to_cache.append(pixels)
+                        to_cache_bytes += pixels.nbytes
+                    else:
+                        to_cache = None  # Stop holding pages
+                        self._render_cache.release(to_cache_bytes)
+                        to_cache_bytes = 0
                 
-                logger.debug(f"Page {page_num + 1} rendered: {pil_image.size}")
+                stats = None
                 
                 # Analyze content if blank page detection is enabled
                 if skip_blank:
+                    # Analyze the rendered RGB buffer directly (no copy, no grayscale conversion)
                     has_content, stats = self.has_meaningful_content(
-                        pil_image,
+                        pixels,
                         tile_size=tile_size,
                         variance_threshold=variance_threshold,
-                        min_informative_tiles=min_informative_tiles
+                        min_informative_tiles=min_informative_tiles,
+                        full_stats=full_stats
                     )
                     stats['page_number'] = page_num + 1
-                    all_stats.append(stats)
                     
                     if not has_content:
                         logger.info(f"⏭️  Page {page_num + 1} skipped (blank/uniform)")
+                        yield None, page_num + 1, stats
                         continue
                 
-                images.append(pil_image)
-                page_numbers.append(page_num + 1)  # 1-indexed page numbers
-            
-            pdf.close()
+                processed += 1
+                
+                if as_array:
+                    # The render buffer itself, read-only since it may also be cached
+                    pixels.setflags(write=False)
+                    yield pixels, page_num + 1, stats  # 1-indexed page numbers
+                    continue
+                
+                # PIL Image is only materialized for pages that go to OCR
+                # (one copy out of the render buffer, so cached pixels are never shared with callers)
+                yield Image.fromarray(pixels), page_num + 1, stats  # 1-indexed page numbers
             
             logger.info(
-                f"✅ Processed {len(images)}/{total_pages} pages "
-                f"(skipped {total_pages - len(images)})"
+                f"✅ Processed {processed}/{total_pages} pages "
+                f"(skipped {total_pages - processed})"
             )
             
+            # Only fully rendered documents are cached
+            if to_cache is not None:
+                self._render_cache.put(cache_key, to_cache)
+            
         except Exception as e:
             logger.error(f"PDF conversion error: {e}")
             raise ValueError(f"Unable to process PDF: {str(e)}")
         
-        return images, page_numbers, all_stats
+        finally:
+            if to_cache_bytes:
+                self._render_cache.release(to_cache_bytes)
+            
+            # Stop background renders before releasing the document
+            if pages is not None:
+                pages.close()
+            if pdf is not None:
+                with _PDFIUM_LOCK:
+                    pdf.close()
+    
+    def _render_pages(
+        self,
+        pdf: pdfium.PdfDocument,
+        pdf_bytes: bytes,
+        total_pages: int,
+        scale: float,
+        max_size: Optional[int] = None
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Renders all pages of a document, yielding (page_index, RGB pixels) in page order.
+        
+        Short documents are rendered one page ahead in a background thread,
+        unless another document is already rendering in-process. Longer documents are rendered by a caller-side process pool (the approach
+        recommended by pypdfium2, whose document-level render() with n_processes is
+        deprecated): the document is written once to a temporary file, each worker
+        opens it once, and each task rasterizes a small range of pages. Only 2 tasks per worker are in flight, so rendering runs ahead of
+        the consumer without materializing the whole document.
+        
+        Args:
+            pdf: Open document (used for in-process rendering)
+            pdf_bytes: Raw PDF content (written once for the worker processes)
+            total_pages: Number of pages in the document
+            scale: Render scale (dpi / 72)
+            max_size: Optional bound on the longest side of each page, in pixels
+            
+        Yields:
+            Tuple of (0-indexed page number, HxWx3 uint8 RGB array)
+        """
+        # Short documents or pool disabled: render in-process (see
+        # _render_pages_local). PDFium calls are serialized process-wide, so
+        # while another document is being rendered in-process, short documents
+        # of concurrent requests go to the pool instead of queueing on the lock
+        use_local = self.render_workers <= 1 or total_pages < PARALLEL_RENDER_MIN_PAGES
+        if use_local:
+            with self._render_executor_lock:
+                if self._local_renders > 0 and self.render_workers > 1:
+                    use_local = False
+                else:
+                    self._local_renders += 1
+        
+        if use_local:
+            try:
+                yield from self._render_pages_local(pdf, total_pages, scale, max_size)
+            finally:
+                with self._render_executor_lock:
+                    self._local_renders -= 1
+            return
+        
+        executor = self._get_render_executor()
+        
+        # The document goes to the workers as a file, written once: tasks only
+        # carry its path and a page range, and each worker opens it once (see
+        # _worker_document) instead of unpickling and parsing it per task
+        fd, pdf_path = tempfile.mkstemp(prefix="pdf-render-", suffix=".pdf")
+        with os.fdopen(fd, "wb") as pdf_file:
+            pdf_file.write(pdf_bytes)
+        
+        ranges = deque(
+            (start, min(start + RENDER_CHUNK_PAGES, total_pages))
+            for start in range(0, total_pages, RENDER_CHUNK_PAGES)
+        )
+        pending = deque()
+        
+        # Short documents don't need every worker: never queue more than
+        # 2 chunks per worker actually usable by this document
+        max_in_flight = 2 * min(self.render_workers, len(ranges))
+        
+        try:
+            while pending or ranges:
+                # Keep the pipeline full, but bounded
+                while ranges and len(pending) < max_in_flight:
+                    start, stop = ranges.popleft()
+                    pending.append((
+                        start,
+                        executor.submit(_render_page_range, pdf_path, start, stop, scale, max_size)
+                    ))
+                
+                start, future = pending.popleft()
+                for offset, pixels in enumerate(future.result()):
+                    yield start + offset, pixels
+        finally:
+            # Consumer stopped early (error or generator closed): drop queued work
+            for _, future in pending:
+                future.cancel()
+            # Workers release their handle on their next task (the data stays
+            # readable until then, even for a task still running)
+            os.unlink(pdf_path)
+    
+    def _render_pages_local(
+        self,
+        pdf: pdfium.PdfDocument,
+        total_pages: int,
+        scale: float,
+        max_size: Optional[int] = None
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Renders all pages of a document in-process, one page ahead of the consumer.
+        
+        Pages are rasterized in a background thread (pdfium releases the GIL),
+        so page N+1 renders while the consumer analyzes page N.
+        
+        Args:
+            pdf: Open document
+            total_pages: Number of pages in the document
+            scale: Render scale (dpi / 72)
+            max_size: Optional bound on the longest side of each page, in pixels
+            
+        Yields:
+            Tuple of (0-indexed page number, HxWx3 uint8 RGB array)
+        """
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-render") as executor:
+            pending = deque()
+            next_index = 0
+            
+            try:
+                while pending or next_index < total_pages:
+                    while next_index < total_pages and len(pending) < RENDER_PREFETCH_PAGES:
+                        pending.append(
+                            (next_index, executor.submit(_render_page, pdf, next_index, scale, max_size))
+                        )
+                        next_index += 1
+                    
+                    page_index, future = pending.popleft()
+                    yield page_index, future.result()
+            finally:
+                # Never leave a render running on a document the caller may close
+                for _, future in pending:
+                    future.cancel()
+    
+    def _get_render_executor(self) -> ProcessPoolExecutor:
+        """
+        Returns the render process pool, creating it on first use.
+        
+        The pool is long-lived so worker startup is paid once, not per document.
+        Workers are started with 'spawn': forking a process that already runs
+        native thread pools (PyTorch, Numba) can deadlock the child.
+        
+        Returns:
+            ProcessPoolExecutor shared by all render calls of this processor
+        """
+        with self._render_executor_lock:
+            if self._render_executor is None:
+                self._render_executor = ProcessPoolExecutor(
+                    max_workers=self.render_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Render pool started ({self.render_workers} processes)")
+            return self._render_executor
+    
+    def close(self) -> None:
+        """
+        Shuts down the render process pool (if started).
+        """
+        with self._render_executor_lock:
+            if self._render_executor is not None:
+                self._render_executor.shutdown(wait=True, cancel_futures=True)
+                self._render_executor = None
     
     def optimize_image_for_ocr(self, image: Image.Image, max_size: int = 2048) -> Image.Image:
         """
         Optimizes an image for OCR processing (resize if too large).
         
         Large images can cause memory issues and slow down inference.
-        This method resizes images while maintaining aspect ratio.
+        This method resizes images while maintaining aspect ratio, using
+        area averaging or antialiased bilinear filtering where they match
+        LANCZOS quality for OCR (see _resample_filter).
         
         Args:
             image: PIL Image to optimize
@@ -158,18 +515,49 @@ class PDFProcessor:
                 new_height = max_size
                 new_width = int(width * (max_size / height))
             
-            # Use LANCZOS for high-quality downsampling
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            logger.debug(f"Image resized: {width}x{height} → {new_width}x{new_height}")
+            # Pick the cheapest filter that preserves OCR quality for this ratio
+            resample = _resample_filter(max_size / max(width, height))
+            image = image.resize((new_width, new_height), resample)
+            logger.debug(
+                f"Image resized: {width}x{height} → {new_width}x{new_height} ({resample.name})"
+            )
         
         return image
     
+    def _gray_scratch(self, height: int, width: int) -> np.ndarray:
+        """
+        Returns a (height, width) uint8 view of a per-thread scratch buffer.
+        
+        The buffer is flat and only grows (to the largest page area seen), so
+        the uint8 grayscale plane is not reallocated for every page, and the
+        returned view is always C-contiguous whatever the page orientation. The analysis
+        still allocates page-sized temporaries per call (uint16 luma terms,
+        and the uint16 pixel squares of the NumPy variance path and of the
+        global statistics). It is thread-local, so concurrent requests never
+        share it.
+        
+        Args:
+            height: Rows needed
+            width: Columns needed
+            
+        Returns:
+            Writable, C-contiguous uint8 view into the scratch buffer (contents undefined)
+        """
+        size = height * width
+        buffer = getattr(self._scratch, "gray", None)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=np.uint8)
+            self._scratch.gray = buffer
+        return buffer[:size].reshape(height, width)
+    
     def has_meaningful_content(
         self, 
-        image: Image.Image,
+        image: Union[Image.Image, np.ndarray],
         tile_size: int = 64,
         variance_threshold: float = 100.0,
-        min_informative_tiles: int = 5
+        min_informative_tiles: int = 5,
+        downsample: int = 2,
+        full_stats: bool = True
     ) -> Tuple[bool, dict]:
         """
         Detects if a page contains meaningful content using ROI-based variance analysis.
@@ -192,78 +580,506 @@ class PDFProcessor:
         - Robust: works for white, black, or any solid color backgrounds
         
         Args:
-            image: PIL Image of the page
+            image: PIL Image of the page, or its pixels as a NumPy array
+                   (HxW grayscale or HxWx3/HxWx4 RGB[A])
             tile_size: Tile size for local analysis (default: 64x64 pixels)
             variance_threshold: Variance threshold for informative tile (default: 100.0)
             min_informative_tiles: Minimum informative tiles required (default: 5)
                                   Even a page with minimal text will have 5+ informative tiles
+            downsample: Pixel stride applied before analysis (default: 2)
+                       Blank detection needs no fine detail: a 2x stride view is
+                       zero-copy and cuts the pixels scanned by 4x. tile_size is
+                       scaled down accordingly so tiles cover the same page area,
+                       and variance is preserved under plain subsampling, so the
+                       same variance_threshold applies
+            full_stats: If False, scan the page in horizontal bands and stop as soon as
+                        min_informative_tiles is reached (default: True)
+                        The decision is identical; tile statistics then only cover
+                        the scanned part of the page (see 'scanned_tiles'), and
+                        'median_tile_variance', 'mean_brightness' and
+                        'global_variance' are not computed (None)
             
         Returns:
             Tuple of (has_content: bool, statistics: dict)
         """
-        # Convert to grayscale for analysis (reduces dimensionality)
-        gray = np.array(image.convert('L'))
+        # Grayscale plane for analysis (reduces dimensionality), computed on
+        # a strided subsampled view and written into the per-thread scratch buffer
+        downsample = max(1, min(downsample, tile_size))
+        gray = _to_grayscale(image, step=downsample, alloc=self._gray_scratch)
+        tile_size = tile_size // downsample
         height, width = gray.shape
         
-        # Global statistics (for reference, not used in decision)
-        mean_brightness = gray.mean()
-        global_variance = gray.var()
-        
-        # Tile-based analysis
-        informative_tiles = 0
-        total_tiles = 0
-        tile_variances = []
-        
-        # Iterate over image in tile_size steps
-        for y in range(0, height - tile_size, tile_size):
-            for x in range(0, width - tile_size, tile_size):
-                # Extract tile (ROI)
-                tile = gray[y:y+tile_size, x:x+tile_size]
-                
-                # Calculate pixel variance in this tile
-                # High variance = edges, text, graphics (information)
-                # Low variance = uniform color (blank)
-                tile_var = tile.var()
-                tile_variances.append(tile_var)
-                total_tiles += 1
-                
-                # Count tiles with high variance as informative
-                if tile_var > variance_threshold:
-                    informative_tiles += 1
+        # Pack a strided grayscale view into the reused contiguous buffer too:
+        # the tile scan then reads sequential memory. Color pages were already
+        # written there (contiguous), so they are never copied onto themselves
+        if not gray.flags.c_contiguous:
+            scratch = self._gray_scratch(height, width)
+            np.copyto(scratch, gray)
+            gray = scratch
+        
+        # Tile-based analysis (vectorized)
+        # Only whole tiles are analyzed; each tile is reduced in a single NumPy
+        # pass instead of one Python-level call per tile
+        tiles_y = height // tile_size
+        tiles_x = width // tile_size
+        total_tiles = tiles_y * tiles_x
+        
+        # Variances are compared as N^2 * Var against threshold * N^2,
+        # so no division is needed for the decision
+        n_pixels = tile_size * tile_size
+        scaled_threshold = variance_threshold * n_pixels * n_pixels
+        
+        if full_stats:
+            # Whole page in one pass
+            scaled_variances = _tile_scaled_variances(
+                gray[:tiles_y * tile_size, :tiles_x * tile_size], tile_size
+            )
+            # count_nonzero counts the boolean mask with SIMD byte counting,
+            # instead of the int64 add-reduction done by mask.sum()
+            informative_tiles = int(np.count_nonzero(scaled_variances > scaled_threshold))
+        else:
+            # Early exit: scan bands of tile rows top to bottom and stop once
+            # enough informative tiles are found (content pages rarely need
+            # more than the first band; blank pages still get a full scan)
+            bands = []
+            informative_tiles = 0
+            for band_start in range(0, tiles_y, EARLY_EXIT_BAND_ROWS):
+                band_end = min(band_start + EARLY_EXIT_BAND_ROWS, tiles_y)
+                band = _tile_scaled_variances(
+                    gray[band_start * tile_size:band_end * tile_size, :tiles_x * tile_size],
+                    tile_size
+                )
+                bands.append(band)
+                informative_tiles += int(np.count_nonzero(band > scaled_threshold))
+                if informative_tiles >= min_informative_tiles:
+                    break
+            scaled_variances = (
+                np.concatenate(bands) if bands else np.zeros((0, tiles_x), dtype=np.int64)
+            )
+        
+        scanned_tiles = int(scaled_variances.size)
+        
+        # Statistics are reduced on the scaled integer grid and divided once
+        variance_scale = float(n_pixels * n_pixels)
+        max_tile_variance = (
+            float(scaled_variances.max()) / variance_scale if scanned_tiles else 0.0
+        )
+        
+        # The median is for monitoring only: skip its partition pass when the
+        # caller did not ask for full statistics
+        median_tile_variance = None
+        if full_stats:
+            median_tile_variance = (
+                float(np.median(scaled_variances)) / variance_scale if scanned_tiles else 0.0
+            )
         
         # Calculate percentage of informative tiles
-        informative_ratio = informative_tiles / total_tiles if total_tiles > 0 else 0
+        informative_ratio = informative_tiles / scanned_tiles if scanned_tiles > 0 else 0
         
         # Decision: page has content if enough informative tiles
         has_content = informative_tiles >= min_informative_tiles
         
+        # Global statistics (for reference, not used in decision)
+        # Two more passes over the page, so they are only computed when they
+        # are returned (full_stats) or logged (blank pages, at INFO level)
+        log_info = logger.isEnabledFor(logging.INFO)
+        mean_brightness = None
+        global_variance = None
+        if full_stats or (not has_content and log_info):
+            # Integer sums (uint16 squares, uint64 accumulators) instead of
+            # mean()/var(), which promote the whole page to float64
+            n_total = gray.size
+            total_sum = int(gray.sum(dtype=np.uint64))
+            total_sq_sum = int(np.square(gray, dtype=np.uint16).sum(dtype=np.uint64))
+            mean_brightness = total_sum / n_total if n_total else 0.0
+            global_variance = (total_sq_sum - total_sum * mean_brightness) / n_total if n_total else 0.0
+        
         # Detailed statistics for monitoring and debugging
         stats = {
             "has_content": has_content,
-            "mean_brightness": float(mean_brightness),
-            "global_variance": float(global_variance),
+            "mean_brightness": mean_brightness,
+            "global_variance": global_variance,
             "total_tiles": total_tiles,
+            "scanned_tiles": scanned_tiles,
             "informative_tiles": informative_tiles,
             "informative_ratio": float(informative_ratio),
-            "max_tile_variance": float(max(tile_variances)) if tile_variances else 0.0,
-            "median_tile_variance": float(np.median(tile_variances)) if tile_variances else 0.0,
+            "max_tile_variance": max_tile_variance,
+            "median_tile_variance": median_tile_variance,
         }
         
-        # Detailed logging
-        if has_content:
-            logger.info(
-                f"✅ Page with content: {informative_tiles}/{total_tiles} informative tiles "
-                f"({informative_ratio*100:.1f}%), var_max={stats['max_tile_variance']:.1f}"
-            )
-        else:
-            logger.info(
-                f"⏭️  Blank/uniform page: {informative_tiles}/{total_tiles} informative tiles "
-                f"({informative_ratio*100:.1f}%), brightness={mean_brightness:.1f}"
-            )
+        # Detailed logging (messages are only formatted if they are emitted)
+        if log_info:
+            if has_content:
+                logger.info(
+                    f"✅ Page with content: {informative_tiles}/{scanned_tiles} informative tiles "
+                    f"({informative_ratio*100:.1f}%), var_max={stats['max_tile_variance']:.1f}"
+                )
+            else:
+                logger.info(
+                    f"⏭️  Blank/uniform page: {informative_tiles}/{scanned_tiles} informative tiles "
+                    f"({informative_ratio*100:.1f}%), brightness={mean_brightness:.1f}"
+                )
         
         return has_content, stats
 
 
+class _RenderCache:
+    """
+    LRU cache of rendered documents, bounded by total pixel memory.
+    
+    Keys are (content hash, render scale, max_size); values are the rendered
+    RGB pixel arrays of the whole document. Entries larger than the budget are never stored, and
+    least recently used entries are evicted until the budget is respected.
+    Thread-safe.
+    
+    Pages held by documents still being rendered (to be stored once complete)
+    are reserved from a second budget of the same size, shared by all
+    in-flight documents, so concurrent requests cannot each hold a full
+    budget of pages.
+    """
+    
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: Memory budget for cached page pixels
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (pages, nbytes)
+        self._size = 0
+        self._reserved = 0  # Bytes held by in-flight documents
+        self._lock = threading.Lock()
+    
+    def reserve(self, nbytes: int) -> bool:
+        """
+        Reserves memory for a page held by an in-flight document.
+        
+        Returns:
+            True if the page fits in the in-flight budget, False otherwise
+        """
+        with self._lock:
+            if self._reserved + nbytes > self.max_bytes:
+                return False
+            self._reserved += nbytes
+            return True
+    
+    def release(self, nbytes: int) -> None:
+        """
+        Returns memory reserved with reserve() (after put(), or when giving up).
+        """
+        with self._lock:
+            self._reserved -= nbytes
+    
+    def get(self, key: tuple) -> Optional[List[np.ndarray]]:
+        """
+        Returns the cached pages for key (marking them recently used), or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+    
+    def put(self, key: tuple, pages: List[np.ndarray]) -> None:
+        """
+        Stores the rendered pages of a document, evicting older entries as needed.
+        """
+        nbytes = sum(page.nbytes for page in pages)
+        if nbytes > self.max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (pages, nbytes)
+            self._size += nbytes
+            
+            while self._size > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._size -= evicted_bytes
+
+
+def _resample_filter(ratio: float) -> Image.Resampling:
+    """
+    Chooses the resampling filter for a downscale by the given ratio.
+    
+    LANCZOS is the slowest PIL filter (widest kernel). For OCR input it is only
+    worth it on strong, fractional reductions:
+    - 1/n ratios (2x, 3x, 4x...): BOX, i.e. exact area averaging
+    - mild reductions (ratio >= 0.5): antialiased BILINEAR, ~2x faster than LANCZOS
+    - anything else: LANCZOS
+    
+    Args:
+        ratio: Target size / source size (0 < ratio < 1)
+        
+    Returns:
+        PIL resampling filter
+    """
+    factor = 1.0 / ratio
+    if abs(factor - round(factor)) < 1e-3:
+        return Image.Resampling.BOX
+    if ratio >= 0.5:
+        return Image.Resampling.BILINEAR
+    return Image.Resampling.LANCZOS
+
+
+def _render_bitmap(
+    page: pdfium.PdfPage,
+    scale: float,
+    max_size: Optional[int] = None
+) -> pdfium.PdfBitmap:
+    """
+    Rasterizes a page straight into an RGB bitmap.
+    
+    PDFium renders BGR(A) by default; rev_byteorder=True makes it write RGB
+    directly, so the bitmap (and its NumPy/PIL views) needs no channel
+    reordering or mode conversion downstream.
+    
+    With max_size, oversized pages are rasterized directly at the reduced
+    size instead of being rendered at full DPI and resized afterwards: the
+    page is drawn once, and the LANCZOS/BILINEAR resize pass disappears.
+    
+    Args:
+        page: PDF page
+        scale: Render scale (dpi / 72)
+        max_size: Optional bound on the longest side of the bitmap, in pixels
+        
+    Returns:
+        PdfBitmap in RGB byte order
+    """
+    if max_size is not None:
+        # Page size is in PDF points (already swapped for rotated pages).
+        # PDFium rounds the bitmap size up: aim just below max_size so that
+        # float error can never produce a max_size + 1 pixel side.
+        longest_side = max(page.get_size())
+        if longest_side > 0:
+            scale = min(scale, (max_size - 1e-6) / longest_side)
+    
+    return page.render(
+        scale=scale,
+        rotation=0,  # No rotation
+        rev_byteorder=True,  # RGB instead of BGR
+        prefer_bgrx=False,  # 3 channels, no padding byte
+    )
+
+
+def _render_page(
+    pdf: pdfium.PdfDocument,
+    page_index: int,
+    scale: float,
+    max_size: Optional[int] = None
+) -> np.ndarray:
+    """
+    Renders a single page of an open document, serialized on the PDFium lock.
+    
+    The page handle is closed as soon as its bitmap is drawn, instead of
+    whenever the garbage collector finalizes the wrapper: long documents
+    never accumulate open PDFium pages.
+    
+    Args:
+        pdf: Open document
+        page_index: 0-indexed page number
+        scale: Render scale (dpi / 72)
+        max_size: Optional bound on the longest side of the page, in pixels
+        
+    Returns:
+        Rendered page as HxWx3 uint8 RGB array, a zero-copy view of the
+        bitmap buffer (the array keeps the buffer alive)
+    """
+    with _PDFIUM_LOCK:
+        page = pdf[page_index]
+        try:
+            return _render_bitmap(page, scale, max_size).to_numpy()
+        finally:
+            # The bitmap buffer is owned by Python (kept alive by the array),
+            # so it stays valid after the page is released
+            page.close()
+
+
+# Documents opened by this render worker process, by file path (LRU order)
+_WORKER_DOCUMENTS: "OrderedDict[str, pdfium.PdfDocument]" = OrderedDict()
+
+
+def _worker_document(pdf_path: str) -> pdfium.PdfDocument:
+    """
+    Returns the open document for a file, opening it on first use (render workers only).
+    
+    A document is opened once per worker, not once per page range. Documents
+    whose file has been removed (render finished in the parent) are closed, and
+    at most WORKER_OPEN_DOCUMENTS stay open.
+    
+    Args:
+        pdf_path: Path of the PDF file written by _render_pages()
+        
+    Returns:
+        Open PdfDocument
+    """
+    for stale_path in [path for path in _WORKER_DOCUMENTS if not os.path.exists(path)]:
+        if stale_path != pdf_path:
+            _WORKER_DOCUMENTS.pop(stale_path).close()
+    
+    pdf = _WORKER_DOCUMENTS.get(pdf_path)
+    if pdf is not None:
+        _WORKER_DOCUMENTS.move_to_end(pdf_path)
+        return pdf
+    
+    pdf = pdfium.PdfDocument(pdf_path)
+    _WORKER_DOCUMENTS[pdf_path] = pdf
+    while len(_WORKER_DOCUMENTS) > WORKER_OPEN_DOCUMENTS:
+        _WORKER_DOCUMENTS.popitem(last=False)[1].close()
+    return pdf
+
+
+def _render_page_range(
+    pdf_path: str,
+    start: int,
+    stop: int,
+    scale: float,
+    max_size: Optional[int] = None
+) -> List[np.ndarray]:
+    """
+    Renders pages [start, stop) of a PDF (runs in a render worker process).
+    
+    Pages are returned as raw HxWx3 RGB arrays: they pickle straight from the
+    bitmap buffer (which the array view keeps alive), without building a PIL
+    image in the worker.
+    
+    Args:
+        pdf_path: Path of the PDF file (see _render_pages)
+        start: First page (0-indexed, inclusive)
+        stop: Last page (0-indexed, exclusive)
+        scale: Render scale (dpi / 72)
+        max_size: Optional bound on the longest side of each page, in pixels
+        
+    Returns:
+        List of rendered pages as uint8 RGB arrays
+    """
+    pdf = _worker_document(pdf_path)
+    # The PDFium lock is process-local (uncontended in a worker)
+    return [
+        _render_page(pdf, page_index, scale, max_size)
+        for page_index in range(start, stop)
+    ]
+
+
+def _tile_scaled_variances(gray: np.ndarray, tile_size: int) -> np.ndarray:
+    """
+    Computes N^2 * variance for every tile of a grayscale image, with N = tile_size^2.
+    
+    Single-pass integer variance: N^2 * Var = N * sum(x^2) - sum(x)^2.
+    Pixel squares fit in uint16 (255^2 = 65025) and the per-tile sums are
+    accumulated in int64, so the result is exact.
+    
+    Args:
+        gray: 2D uint8 array whose dimensions are multiples of tile_size
+        tile_size: Tile edge in pixels
+        
+    Returns:
+        2D int64 array of shape (rows, cols) with the scaled tile variances
+    """
+    if NUMBA_AVAILABLE:
+        # The kernel already uses every core: concurrent calls would only
+        # oversubscribe them
+        with _NUMBA_LOCK:
+            return _tile_scaled_variances_numba(gray, tile_size)
+    
+    tiles_y = gray.shape[0] // tile_size
+    tiles_x = gray.shape[1] // tile_size
+    
+    # (rows, tile, cols, tile) view: reducing axes 1 and 3 yields one value per tile
+    grid_shape = (tiles_y, tile_size, tiles_x, tile_size)
+    n_pixels = tile_size * tile_size
+    
+    tile_sums = gray.reshape(grid_shape).sum(axis=(1, 3), dtype=np.int64)
+    tile_sq_sums = np.square(gray, dtype=np.uint16).reshape(grid_shape).sum(
+        axis=(1, 3), dtype=np.int64
+    )
+    
+    # High variance = edges, text, graphics (information)
+    # Low variance = uniform color (blank)
+    return tile_sq_sums * n_pixels - tile_sums * tile_sums
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _tile_scaled_variances_numba(gray, tile_size):
+        """
+        Numba version of _tile_scaled_variances.
+        
+        Tile rows are processed in parallel and each tile is accumulated in
+        registers, so no (rows, tile, cols, tile) temporaries are allocated.
+        """
+        tiles_y = gray.shape[0] // tile_size
+        tiles_x = gray.shape[1] // tile_size
+        n_pixels = tile_size * tile_size
+        out = np.empty((tiles_y, tiles_x), dtype=np.int64)
+        
+        for ty in prange(tiles_y):
+            y0 = ty * tile_size
+            for tx in range(tiles_x):
+                x0 = tx * tile_size
+                s = 0
+                s2 = 0
+                for y in range(y0, y0 + tile_size):
+                    for x in range(x0, x0 + tile_size):
+                        v = np.int64(gray[y, x])
+                        s += v
+                        s2 += v * v
+                out[ty, tx] = s2 * n_pixels - s * s
+        
+        return out
+
+
+def _to_grayscale(
+    image: Union[Image.Image, np.ndarray],
+    step: int = 1,
+    alloc: Optional[Callable[[int, int], np.ndarray]] = None
+) -> np.ndarray:
+    """
+    Computes an 8-bit luma plane directly from the RGB pixel buffer.
+    
+    Works on a NumPy view of the existing RGB data instead of asking PIL to
+    allocate a separate 'L' image first. Uses the integer approximation of
+    ITU-R BT.601 weights (76, 150, 30) / 256, which is more than accurate
+    enough for variance-based blank page detection. All three channels are
+    needed: a single channel is flat for text whose color saturates it
+    (e.g. green or cyan text on white).
+    
+    Args:
+        image: PIL Image or NumPy array (HxW, HxWx3 or HxWx4)
+        step: Keep every step-th row and column (strided view, no copy)
+        alloc: Optional function (height, width) -> uint8 array that receives
+               the luma of color input (default: a new array)
+        
+    Returns:
+        2D uint8 array with the grayscale page (a view of the input if it
+        is already grayscale)
+    """
+    if isinstance(image, Image.Image):
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        image = np.asarray(image)
+    
+    if step > 1:
+        image = image[::step, ::step]
+    
+    # Already grayscale
+    if image.ndim == 2:
+        return image
+    
+    height, width = image.shape[:2]
+    gray = alloc(height, width) if alloc is not None else np.empty((height, width), dtype=np.uint8)
+    
+    # Integer luma: (76*R + 150*G + 30*B) >> 8 fits in uint16 (max 65280)
+    luma = np.multiply(image[..., 0], 76, dtype=np.uint16)
+    term = np.multiply(image[..., 1], 150, dtype=np.uint16)
+    luma += term
+    np.multiply(image[..., 2], 30, out=term, dtype=np.uint16)
+    luma += term
+    np.right_shift(luma, 8, out=gray, casting="unsafe")
+    return gray
+
+
 def images_to_markdown(ocr_results: List[str]) -> str:
     """
     Converts OCR results from multiple pages into a single Markdown document.
@@ -277,17 +1093,19 @@ def images_to_markdown(ocr_results: List[str]) -> str:
     Returns:
         Complete Markdown document with page separators
     """
-    markdown_parts = []
+    # Three fragments per page (separator, page comment, text),
+    # written by index into a list sized up front
+    markdown_parts = [""] * (3 * len(ocr_results))
     
-    for page_num, text in enumerate(ocr_results, start=1):
+    for index, text in enumerate(ocr_results):
         # Add page separator (horizontal rule) between pages
-        if page_num > 1:
-            markdown_parts.append("\n\n---\n\n")
+        if index > 0:
+            markdown_parts[3 * index] = PAGE_SEPARATOR
         
         # Add HTML comment with page number (useful for debugging/tracking)
-        markdown_parts.append(f"<!-- Page {page_num} -->\n\n")
+        markdown_parts[3 * index + 1] = f"<!-- Page {index + 1} -->\n\n"
         
         # Add OCR text (stripped of leading/trailing whitespace)
-        markdown_parts.append(text.strip())
+        markdown_parts[3 * index + 2] = text.strip()
     
     return "".join(markdown_parts)
@@ -38,4 +38,5 @@ echo -e "${YELLOW}Premi Ctrl+C per terminare${NC}"
 echo ""
 
 export PORT=8080
-python3 server.py
+# CLI di uvicorn: i processi di rendering non reimportano server.py
+exec uvicorn server:app --host 0.0.0.0 --port "$PORT" --loop uvloop --http httptools
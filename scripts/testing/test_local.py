@@ -146,7 +146,7 @@ def main():
     
     if not health_ok:
         print("\n❌ Server non disponibile. Assicurati che sia in esecuzione:")
-        print("   python3 server.py")
+        print("   uvicorn server:app --host 0.0.0.0 --port 8080 --loop uvloop --http httptools")
         sys.exit(1)
     
     # Test 2 e 3: Solo se abbiamo un PDF
@@ -13,7 +13,7 @@ Endpoints:
 Features:
     - Intelligent blank page detection (ROI-based variance analysis)
     - GPU acceleration (CUDA support)
-    - Automatic image optimization
+    - Pages rendered directly at OCR resolution (no resize pass)
     - Markdown output format
     - Detailed processing statistics
 
@@ -21,25 +21,53 @@ Environment Variables:
     - MODEL_ID: HuggingFace model ID (default: PaddlePaddle/PaddleOCR-VL)
     - MAX_NEW_TOKENS: Maximum tokens for generation (default: 2048)
     - PDF_DPI: PDF rendering resolution (default: 200)
+    - PDF_RENDER_WORKERS: Processes for parallel page rendering (default: CPU cores, max 4)
+    - PDF_RENDER_CACHE_MB: Memory budget for reusing rendered pages of repeated PDFs (default: 0, disabled)
+    - OCR_BATCH_SIZE: Pages recognized together in one generate() call (default: 4)
+    - OCR_BATCH_TIMEOUT_MS: Max wait for more rendered pages before running a partial batch (default: 50)
+    - TORCH_COMPILE: Set to 1 to compile the model with torch.compile at startup (default: 0)
+    - ATTN_IMPL: Attention implementation on GPU (default: flash_attention_2, falls back to sdpa)
+    - QUANT: Weight quantization on GPU with bitsandbytes: none, int8 or nf4 (default: none)
+    - VLLM_BACKEND: Set to 1 to run inference on an in-process vLLM engine (default: 0)
+    - GPU_CONCURRENCY: Model calls allowed to run on the GPU at the same time (default: 1)
     - PORT: Server port (default: 8080)
 """
 
 import os
 import io
+import json
+import time
+import asyncio
 import logging
-import base64
-from typing import Optional, List, Dict, Any
-from contextlib import asynccontextmanager
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple, Union, AsyncIterator
+from contextlib import aclosing, asynccontextmanager, closing
 
+import numpy as np
 import torch
 import uvicorn
 from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from transformers import AutoModelForCausalLM, AutoProcessor
+from transformers import (
+    AutoModelForCausalLM,
+    AutoProcessor,
+    BitsAndBytesConfig,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    AsyncTextIteratorStreamer,
+)
 from PIL import Image
 
-from pdf_processor import PDFProcessor, images_to_markdown
+from pdf_processor import PDFProcessor, PAGE_SEPARATOR, images_to_markdown
+
+# Optional: SIMD base64 decoder, same API (falls back to the standard library if unavailable)
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 # Logging configuration
 logging.basicConfig(
@@ -53,12 +81,33 @@ MODEL_ID = os.getenv("MODEL_ID", "PaddlePaddle/PaddleOCR-VL")  # HuggingFace mod
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"  # Auto-detect GPU
 MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", "2048"))  # Max generation length
 DPI = int(os.getenv("PDF_DPI", "200"))  # PDF rendering resolution (200-300 optimal for OCR)
+RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "0")) or None  # Render processes (None = auto)
+RENDER_CACHE_MB = int(os.getenv("PDF_RENDER_CACHE_MB", "0"))  # Rendered page cache budget (0 = off)
+MAX_IMAGE_SIZE = 2048  # Longest page side sent to the model (pages are rendered to fit)
+OCR_BATCH_SIZE = max(1, int(os.getenv("OCR_BATCH_SIZE", "4")))  # Pages per generate() call
+OCR_BATCH_TIMEOUT_MS = int(os.getenv("OCR_BATCH_TIMEOUT_MS", "50"))  # Max wait to fill a batch
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "0") == "1"  # Compile the model forward pass at startup
+ATTN_IMPL = os.getenv("ATTN_IMPL", "flash_attention_2")  # Attention kernel on GPU (falls back to sdpa)
+QUANT = os.getenv("QUANT", "none").lower()  # Weight quantization on GPU: none, int8, nf4
+VLLM_BACKEND = os.getenv("VLLM_BACKEND", "0") == "1"  # Serve the model with vLLM instead of transformers
+GPU_CONCURRENCY = max(1, int(os.getenv("GPU_CONCURRENCY", "1")))  # Concurrent generate() calls
 
 # Global variables for model and processor (loaded at startup)
 model = None  # PaddleOCR-VL model instance
+vllm_engine = None  # vLLM engine (VLLM_BACKEND=1, replaces model)
 processor = None  # Tokenizer and image processor
 pdf_processor = None  # PDF to image converter
 
+# Gate for transformers inference: each generate() call allocates its own
+# activations and KV cache, so concurrent requests queue here instead of
+# growing (and fragmenting) GPU memory. vLLM manages its own paged KV cache.
+GPU_SEM = asyncio.Semaphore(GPU_CONCURRENCY)
+
+# Threads running model calls. Kept apart from asyncio's default pool, which
+# is shared with everything else: a model call never waits for a free thread
+# behind blocked render threads (see _rendered_pages)
+GPU_EXECUTOR = ThreadPoolExecutor(max_workers=GPU_CONCURRENCY, thread_name_prefix="gpu")
+
 
 # Pydantic models for OpenAI-compatible API
 class Message(BaseModel):
@@ -83,6 +132,97 @@ class ChatCompletionResponse(BaseModel):
     usage: Dict[str, int]
 
 
+def load_model() -> AutoModelForCausalLM:
+    """
+    Loads the PaddleOCR-VL model with transformers, on DEVICE.
+    
+    Picks the fastest available attention implementation and applies the
+    optional QUANT weight quantization.
+    
+    Returns:
+        Model in inference mode
+        
+    Raises:
+        ValueError: If QUANT is invalid
+    """
+    # Attention kernel: ATTN_IMPL (FlashAttention-2 by default) on GPU,
+    # falling back to PyTorch SDPA (which dispatches to its own flash /
+    # memory-efficient kernels), then to the eager implementation
+    if DEVICE == "cuda":
+        torch.backends.cuda.enable_flash_sdp(True)
+        torch.backends.cuda.enable_mem_efficient_sdp(True)
+    attn_candidates = [ATTN_IMPL] if DEVICE == "cuda" else []
+    attn_candidates += [impl for impl in ("sdpa", "eager") if impl not in attn_candidates]
+    
+    # Weight-only quantization (bitsandbytes): decode is bound by weight
+    # reads, so 8/4-bit weights cut memory traffic and VRAM
+    quantization_config = None
+    if QUANT == "int8":
+        quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+    elif QUANT == "nf4":
+        quantization_config = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_compute_dtype=torch.bfloat16,
+            bnb_4bit_quant_type="nf4"
+        )
+    elif QUANT != "none":
+        raise ValueError(f"Invalid QUANT '{QUANT}' (expected none, int8 or nf4)")
+    
+    if quantization_config is not None and DEVICE != "cuda":
+        logger.warning(f"⚠️  QUANT={QUANT} requires CUDA, loading unquantized weights")
+        quantization_config = None
+    
+    # Load model (PaddleOCR-VL vision-language model)
+    for attn_impl in attn_candidates:
+        try:
+            model = AutoModelForCausalLM.from_pretrained(
+                MODEL_ID,
+                trust_remote_code=True,
+                torch_dtype=torch.bfloat16 if DEVICE == "cuda" else torch.float32,  # FP16 on GPU, FP32 on CPU
+                low_cpu_mem_usage=True,  # Optimize memory usage
+                attn_implementation=attn_impl,
+                quantization_config=quantization_config,
+                device_map={"": DEVICE}  # Load shards straight onto DEVICE (no CPU copy + .to())
+            )
+            break
+        except (ImportError, ValueError) as e:
+            # flash-attn not installed, or kernel not supported by the model
+            if attn_impl == attn_candidates[-1]:
+                raise
+            logger.warning(f"⚠️  Attention '{attn_impl}' unavailable ({e}), trying next")
+    
+    model.eval()  # Set to inference mode (disable dropout, etc.)
+    logger.info(f"✅ Model loaded on {DEVICE} (attention: {attn_impl}, quantization: {QUANT})")
+    
+    return model
+
+
+def load_vllm_engine() -> Any:
+    """
+    Starts an in-process vLLM engine for PaddleOCR-VL (VLLM_BACKEND=1).
+    
+    vLLM adds PagedAttention, continuous batching and prefix caching: pages
+    of concurrent requests share the GPU without a custom batching queue.
+    
+    Returns:
+        vllm.AsyncLLMEngine instance
+    """
+    # Optional dependency: only imported when the backend is enabled
+    from vllm import AsyncEngineArgs, AsyncLLMEngine
+    
+    engine = AsyncLLMEngine.from_engine_args(
+        AsyncEngineArgs(
+            model=MODEL_ID,
+            dtype="bfloat16",
+            max_num_batched_tokens=8192,
+            gpu_memory_utilization=0.85,  # Leave room for the render workers / CUDA context
+            trust_remote_code=True
+        )
+    )
+    logger.info("✅ vLLM engine started")
+    return engine
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -92,32 +232,81 @@ async def lifespan(app: FastAPI):
     Shutdown: Cleans up resources and frees GPU memory
     """
     # Startup: load model and processors
-    global model, processor, pdf_processor
+    global model, processor, pdf_processor, vllm_engine
     
     logger.info(f"🚀 Starting server on device: {DEVICE}")
     logger.info(f"📦 Loading model: {MODEL_ID}")
     
     try:
+        if DEVICE == "cuda":
+            # Let the occasional FP32 op (e.g. in image preprocessing) use TF32
+            # tensor cores, and let cuDNN pick the fastest conv algorithms
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cudnn.benchmark = True
+            torch.set_float32_matmul_precision("high")
+        
         # Load processor (tokenizer + image processor)
         processor = AutoProcessor.from_pretrained(
             MODEL_ID,
             trust_remote_code=True
         )
+        # Decoder-only generation needs prompts aligned on the right
+        processor.tokenizer.padding_side = "left"
+        # Pages are handed over as RGB arrays (see _to_rgb_array): no RGB conversion
+        if hasattr(processor, "image_processor"):
+            processor.image_processor.do_convert_rgb = False
+        
+        # Render the chat template of every task once (only images change per page)
+        for task in PROMPTS:
+            get_chat_prompt(task)
         logger.info("✅ Processor loaded")
         
-        # Load model (PaddleOCR-VL vision-language model)
-        model = AutoModelForCausalLM.from_pretrained(
-            MODEL_ID,
-            trust_remote_code=True,
-            torch_dtype=torch.bfloat16 if DEVICE == "cuda" else torch.float32,  # FP16 on GPU, FP32 on CPU
-            low_cpu_mem_usage=True  # Optimize memory usage
-        ).to(DEVICE)
+        if VLLM_BACKEND:
+            # vLLM serves the model (continuous batching, paged KV cache);
+            # the processor above is still used for the chat template
+            vllm_engine = load_vllm_engine()
+        else:
+            model = load_model()
         
-        model.eval()  # Set to inference mode (disable dropout, etc.)
-        logger.info(f"✅ Model loaded on {DEVICE}")
+        if TORCH_COMPILE and model is not None:
+            # Only forward() is compiled: generate() is a Python loop that
+            # torch.compile does not handle reliably. "reduce-overhead" fuses
+            # kernels and replays decode steps as CUDA graphs
+            model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=False)
+            
+            # Fixed-size KV cache: a DynamicCache grows at every decode step,
+            # so its shapes change and the steps cannot be replayed as CUDA
+            # graphs. The static cache is preallocated for the whole generation
+            model.generation_config.cache_implementation = "static"
+            
+            # Pay the compilation (and cache allocation) cost now, not on the
+            # first request. The warmup runs on GPU_EXECUTOR like real requests:
+            # recorded CUDA graphs are thread-local, so graphs recorded on this
+            # thread would not be replayed by inference threads
+            logger.info("⏳ Compiling model (warmup)...")
+            warmup_image = Image.new("RGB", (1024, 1024), "white")
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(GPU_EXECUTOR, run_ocr_on_image, warmup_image)
+            except HTTPException as e:
+                # Only model code without static cache support falls back
+                # (generate() rejects cache_implementation="static" with a
+                # ValueError); compilation, OOM, ... are real startup errors
+                cause = e.__cause__
+                if not (isinstance(cause, ValueError) and "cache_implementation" in str(cause)):
+                    raise (cause or e) from None
+                logger.warning(f"⚠️  Static KV cache unavailable ({cause}), using dynamic cache")
+                model.generation_config.cache_implementation = None
+                await loop.run_in_executor(GPU_EXECUTOR, run_ocr_on_image, warmup_image)
+            logger.info("✅ Model compiled")
         
         # Initialize PDF processor
-        pdf_processor = PDFProcessor(dpi=DPI)
+        pdf_processor = PDFProcessor(
+            dpi=DPI,
+            render_workers=RENDER_WORKERS,
+            render_cache_bytes=RENDER_CACHE_MB * 1024 * 1024
+        )
         logger.info("✅ PDF Processor initialized")
         
         logger.info("🎉 Server ready to accept requests")
@@ -130,8 +319,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown: cleanup resources
     logger.info("🛑 Shutting down server")
+    if pdf_processor is not None:
+        pdf_processor.close()  # Stop render worker processes
     if model is not None:
         del model
+    if vllm_engine is not None:
+        del vllm_engine
     if processor is not None:
         del processor
     torch.cuda.empty_cache() if torch.cuda.is_available() else None  # Free GPU memory
@@ -155,7 +348,7 @@ async def health_check():
     """
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
+        "model_loaded": model is not None or vllm_engine is not None,
         "device": DEVICE,
         "cuda_available": torch.cuda.is_available()
     }
@@ -180,15 +373,158 @@ async def root():
     }
 
 
-def run_ocr_on_image(image: Image.Image, task: str = "ocr") -> str:
+# Data URI prefix of the PDFs sent to /v1/chat/completions
+PDF_DATA_URI_PREFIX = "data:application/pdf;base64,"
+
+# Official prompts from PaddleOCR-VL documentation
+# These prompts guide the model's behavior for different tasks
+PROMPTS = {
+    "ocr": "OCR:",
+    "table": "Table Recognition:",
+    "formula": "Formula Recognition:",
+    "chart": "Chart Recognition:",
+}
+
+# Generation budget per task: a formula is a single LaTeX expression, while
+# full pages, tables and chart data can use the whole MAX_NEW_TOKENS
+TASK_MAX_NEW_TOKENS = {
+    "ocr": MAX_NEW_TOKENS,
+    "table": MAX_NEW_TOKENS,
+    "formula": min(MAX_NEW_TOKENS, 1024),
+    "chart": MAX_NEW_TOKENS,
+}
+
+
+def _to_rgb_array(image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+    """
+    Returns the pixels of an image as an HxWx3 RGB array for the processor.
+    
+    Grayscale is broadcast to 3 channels and alpha is dropped with NumPy
+    views, instead of a PIL convert() pass.
+    
+    Args:
+        image: PIL Image or NumPy array (HxW, HxWx3 or HxWx4)
+        
+    Returns:
+        HxWx3 uint8 array (possibly a read-only view)
+    """
+    # Palette/CMYK/etc. pixels are not RGB values: only those go through PIL
+    if isinstance(image, Image.Image) and image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGB")
+    
+    pixels = np.asarray(image)
+    if pixels.ndim == 2:
+        return np.broadcast_to(pixels[..., None], (*pixels.shape, 3))
+    if pixels.shape[2] == 4:
+        return pixels[..., :3]
+    return pixels
+
+
+# Chat template rendered once per task (filled at startup, see get_chat_prompt)
+PROMPT_TEMPLATES: Dict[str, str] = {}
+
+
+def get_chat_prompt(task: str = "ocr") -> str:
+    """
+    Returns the chat template text for a task, rendering it on first use.
+    
+    The conversation is the same for every page (one image placeholder and
+    the task prompt), so the Jinja template is rendered once instead of once
+    per page. The placeholder is not expanded here: the number of image
+    tokens depends on each page's size and is filled in by the processor.
+    
+    Args:
+        task: Task type ('ocr', 'table', 'formula', 'chart'); unknown tasks use 'ocr'
+        
+    Returns:
+        Prompt text, including the assistant generation prompt
     """
-    Runs OCR on a single image using PaddleOCR-VL vision-language model.
+    if task not in PROMPTS:
+        task = "ocr"
+    
+    prompt = PROMPT_TEMPLATES.get(task)
+    if prompt is None:
+        # PaddleOCR-VL uses a vision-language chat interface
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image"},
+                    {"type": "text", "text": PROMPTS[task]},
+                ]
+            }
+        ]
+        prompt = processor.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True  # Add assistant prompt
+        )
+        PROMPT_TEMPLATES[task] = prompt
+    
+    return prompt
+
+
+class _StopOnRepeat(StoppingCriteria):
+    """
+    Stops sequences that are stuck repeating the same short token pattern.
+    
+    A VLM can fall into a loop (e.g. the same cell or dot leader over and
+    over) and would then decode until max_new_tokens. A sequence is stopped
+    once its last `window` generated tokens are periodic with a period of at
+    most `max_period` tokens; all periods are checked with one comparison.
+    """
+    
+    def __init__(self, prompt_length: int, max_period: int = 8, window: int = 128):
+        self.prompt_length = prompt_length
+        self.max_period = max_period
+        self.window = window
+        self._shifts = None  # [max_period, window] gather indices, built on first call
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        span = self.window + self.max_period
+        if input_ids.shape[1] - self.prompt_length < span:
+            return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        
+        if self._shifts is None:
+            # Row p-1 selects the last `window` tokens shifted back by p
+            periods = torch.arange(1, self.max_period + 1, device=input_ids.device)
+            positions = torch.arange(self.window, device=input_ids.device)
+            self._shifts = self.max_period - periods[:, None] + positions[None, :]
+        
+        tail = input_ids[:, -span:]
+        current = tail[:, self.max_period:]  # [batch, window]
+        shifted = tail[:, self._shifts]  # [batch, max_period, window]
+        return (shifted == current[:, None, :]).all(dim=2).any(dim=1)
+
+
+def _generation_limits(task: str, prompt_length: int) -> Dict[str, Any]:
+    """
+    Returns the generate() arguments that bound the decode length for a task.
+    
+    Args:
+        task: Task type ('ocr', 'table', 'formula', 'chart')
+        prompt_length: Length of the (padded) prompt in tokens
+        
+    Returns:
+        Keyword arguments: max_new_tokens and the repetition stopping criterion
+    """
+    return {
+        "max_new_tokens": TASK_MAX_NEW_TOKENS.get(task, MAX_NEW_TOKENS),
+        "stopping_criteria": StoppingCriteriaList([_StopOnRepeat(prompt_length)]),
+    }
+
+
+def run_ocr_on_images(images: List[Union[Image.Image, np.ndarray]], task: str = "ocr") -> Tuple[List[str], List[int]]:
+    """
+    Runs OCR on a batch of images with a single PaddleOCR-VL generate() call.
     
     This function uses the official PaddleOCR-VL chat template format for inference.
+    All images share one prefill and one decode loop: batching amortizes kernel
+    launches and keeps the GPU busy, instead of paying both once per page.
     The model supports multiple document understanding tasks beyond basic OCR.
     
     Args:
-        image: PIL Image in RGB format
+        images: Page images, PIL Images or RGB(A)/grayscale NumPy arrays (one per page)
         task: Task type - one of:
             - 'ocr': General text recognition (default)
             - 'table': Table structure recognition
@@ -196,69 +532,544 @@ def run_ocr_on_image(image: Image.Image, task: str = "ocr") -> str:
             - 'chart': Chart and diagram recognition
         
     Returns:
-        Extracted text from the image
+        Tuple containing:
+            - Extracted text for each image, in input order
+            - Number of generated (completion) tokens for each image
         
     Raises:
         HTTPException: If OCR processing fails
     """
+    if not images:
+        return [], []
+    
     try:
-        # Official prompts from PaddleOCR-VL documentation
-        # These prompts guide the model's behavior for different tasks
-        PROMPTS = {
-            "ocr": "OCR:",
-            "table": "Table Recognition:",
-            "formula": "Formula Recognition:",
-            "chart": "Chart Recognition:",
-        }
+        # Chat template already rendered for this task (see get_chat_prompt)
+        prompt = get_chat_prompt(task)
         
-        # Convert image to RGB if necessary (model requires RGB input)
-        if image.mode != "RGB":
-            image = image.convert("RGB")
+        # RGB pixel arrays (model requires RGB input); RGB pages need no conversion
+        images = [_to_rgb_array(image) for image in images]
         
-        # Prepare message in chat template format
-        # PaddleOCR-VL uses a vision-language chat interface
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image", "image": image},
-                    {"type": "text", "text": PROMPTS.get(task, "OCR:")},
-                ]
-            }
-        ]
-        
-        # Apply chat template and tokenize
-        # This converts the message into model input format
-        inputs = processor.apply_chat_template(
-            messages,
-            tokenize=True,
-            add_generation_prompt=True,  # Add assistant prompt
-            return_dict=True,
+        # Tokenize the whole batch and compute the image features; the
+        # processor expands each image placeholder to that page's patch count.
+        # Prompts are left-padded (see lifespan) so generation continues
+        # right after each prompt
+        inputs = processor(
+            text=[prompt] * len(images),
+            images=images,
+            padding=True,  # Pad prompts to the same length
             return_tensors="pt"  # PyTorch tensors
         ).to(DEVICE)
         
-        # Run inference (no gradient computation needed)
+        # Every row starts with the (padded) prompt
+        prompt_length = inputs["input_ids"].shape[1]
+        
+        # Run inference (no gradient computation needed); pages stop at EOS,
+        # at the task's token budget or when stuck in a repetition loop
         with torch.inference_mode():
             generated_ids = model.generate(
                 **inputs,
-                max_new_tokens=MAX_NEW_TOKENS,  # Maximum output length
                 do_sample=False,  # Deterministic generation (no sampling)
-                use_cache=True  # Enable KV cache for faster generation
+                use_cache=True,  # Enable KV cache for faster generation
+                **_generation_limits(task, prompt_length)
             )
         
-        # Decode generated tokens to text
-        generated_text = processor.batch_decode(
-            generated_ids,
-            skip_special_tokens=True  # Remove <s>, </s>, etc.
-        )[0]
+        # Decode only the completion
+        completion_ids = generated_ids[:, prompt_length:]
+        generated_texts = processor.batch_decode(
+            completion_ids,
+            skip_special_tokens=True  # Remove <s>, </s>, padding, etc.
+        )
+        
+        # Real token counts for the API usage, straight from generate():
+        # rows that stopped early are padded after their last token with the
+        # generation pad id, which generate() falls back to EOS when unset
+        generation_config = model.generation_config
+        pad_token_id = generation_config.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = generation_config.eos_token_id
+        if isinstance(pad_token_id, (list, tuple)):
+            pad_token_id = pad_token_id[0] if pad_token_id else None
+        if pad_token_id is None:
+            token_counts = [completion_ids.shape[1]] * len(generated_texts)
+        else:
+            token_counts = (completion_ids != pad_token_id).sum(dim=1).tolist()
+        
+        return generated_texts, token_counts
+        
+    except Exception as e:
+        logger.error(f"OCR error: {e}")
+        raise HTTPException(status_code=500, detail=f"OCR error: {str(e)}") from e
+
+
+async def run_ocr_on_images_vllm(
+    images: List[Union[Image.Image, np.ndarray]],
+    task: str = "ocr"
+) -> Tuple[List[str], List[int]]:
+    """
+    Runs OCR on a batch of images with the vLLM engine (VLLM_BACKEND=1).
+    
+    Pages are submitted as independent requests: the engine batches them
+    continuously with pages of other requests.
+    
+    Args:
+        images: PIL Images or HxWx3 RGB NumPy arrays (one per page)
+        task: Task type ('ocr', 'table', 'formula', 'chart')
+        
+    Returns:
+        Tuple containing:
+            - Extracted text for each image, in input order
+            - Number of generated (completion) tokens for each image
         
-        return generated_text
+    Raises:
+        HTTPException: If OCR processing fails
+    """
+    from vllm import SamplingParams
+    
+    if not images:
+        return [], []
+    
+    try:
+        # Same chat template as the transformers path: vLLM inserts the
+        # image features at the image placeholder
+        prompt = get_chat_prompt(task)
+        sampling_params = SamplingParams(
+            temperature=0.0,  # Deterministic generation (greedy)
+            max_tokens=TASK_MAX_NEW_TOKENS.get(task, MAX_NEW_TOKENS)
+        )
+        
+        async def generate(image: Union[Image.Image, np.ndarray]) -> Tuple[str, int]:
+            final_output = None
+            async for output in vllm_engine.generate(
+                {"prompt": prompt, "multi_modal_data": {"image": image}},
+                sampling_params,
+                request_id=uuid.uuid4().hex
+            ):
+                final_output = output  # Outputs are cumulative: keep the last one
+            completion = final_output.outputs[0]
+            return completion.text, len(completion.token_ids)
+        
+        results = await asyncio.gather(*(generate(image) for image in images))
+        return [text for text, _ in results], [count for _, count in results]
         
     except Exception as e:
         logger.error(f"OCR error: {e}")
         raise HTTPException(status_code=500, detail=f"OCR error: {str(e)}")
 
 
+def run_ocr_on_image(image: Union[Image.Image, np.ndarray], task: str = "ocr") -> str:
+    """
+    Runs OCR on a single image (batch of one, see run_ocr_on_images).
+    
+    Args:
+        image: PIL Image or HxWx3 RGB NumPy array
+        task: Task type ('ocr', 'table', 'formula', 'chart')
+        
+    Returns:
+        Extracted text from the image
+    """
+    texts, _ = run_ocr_on_images([image], task=task)
+    return texts[0]
+
+
+class _StopOnEvent(StoppingCriteria):
+    """
+    Stops generation as soon as an event is set (e.g. the client went away).
+    """
+    
+    def __init__(self, event: threading.Event):
+        self.event = event
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full(
+            (input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device
+        )
+
+
+async def stream_ocr_on_image(image: Union[Image.Image, np.ndarray], task: str = "ocr") -> AsyncIterator[str]:
+    """
+    Runs OCR on a single image, yielding the text as it is generated.
+    
+    With transformers, generate() runs on GPU_EXECUTOR and feeds an
+    AsyncTextIteratorStreamer, read directly by the event loop; if the
+    consumer stops early (client disconnected), generation is stopped at the
+    next decode step so the GPU is released.
+    With the vLLM engine, the cumulative outputs are turned into deltas.
+    
+    Args:
+        image: PIL Image or HxWx3 RGB NumPy array
+        task: Task type ('ocr', 'table', 'formula', 'chart')
+        
+    Yields:
+        Successive pieces of the extracted text
+    """
+    prompt = get_chat_prompt(task)
+    
+    if vllm_engine is not None:
+        from vllm import SamplingParams
+        
+        sampling_params = SamplingParams(
+            temperature=0.0,
+            max_tokens=TASK_MAX_NEW_TOKENS.get(task, MAX_NEW_TOKENS)
+        )
+        sent = 0
+        async for output in vllm_engine.generate(
+            {"prompt": prompt, "multi_modal_data": {"image": image}},
+            sampling_params,
+            request_id=uuid.uuid4().hex
+        ):
+            text = output.outputs[0].text
+            if len(text) > sent:
+                yield text[sent:]
+                sent = len(text)
+        return
+    
+    # One generation at a time on the GPU (see GPU_SEM), held until
+    # generate() has finished
+    async with GPU_SEM:
+        loop = asyncio.get_running_loop()
+        
+        def prepare() -> Any:
+            return processor(
+                text=[prompt],
+                images=[_to_rgb_array(image)],
+                return_tensors="pt"
+            ).to(DEVICE)
+        
+        # Image preprocessing and tokenization are CPU-heavy: keep them off
+        # the event loop, like the batched path does
+        inputs = await loop.run_in_executor(GPU_EXECUTOR, prepare)
+        
+        streamer = AsyncTextIteratorStreamer(
+            processor.tokenizer,
+            skip_prompt=True,  # Only the completion
+            skip_special_tokens=True
+        )
+        cancelled = threading.Event()
+        errors = []
+        limits = _generation_limits(task, inputs["input_ids"].shape[1])
+        limits["stopping_criteria"].append(_StopOnEvent(cancelled))
+        
+        def generate() -> None:
+            try:
+                with torch.inference_mode():
+                    model.generate(
+                        **inputs,
+                        do_sample=False,
+                        use_cache=True,
+                        streamer=streamer,
+                        **limits
+                    )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()  # Unblock the consumer
+        
+        generation = loop.run_in_executor(GPU_EXECUTOR, generate)
+        
+        try:
+            # Decoded text is handed to the event loop as it is produced
+            async for text in streamer:
+                if text:
+                    yield text
+        finally:
+            cancelled.set()  # No-op if generation already finished
+            await asyncio.shield(generation)
+    
+    if errors:
+        logger.error(f"OCR error: {errors[0]}")
+        raise HTTPException(status_code=500, detail=f"OCR error: {str(errors[0])}")
+
+
+async def _ocr_batch(
+    images: List[Union[Image.Image, np.ndarray]],
+    page_numbers: List[int]
+) -> Tuple[List[str], List[int]]:
+    """
+    Runs batched OCR on consecutive pages of a document, with progress logging.
+    
+    Inference runs on the vLLM engine if enabled, otherwise on GPU_EXECUTOR
+    (so the event loop is not blocked).
+    
+    Args:
+        images: Page images (consumed: the list is cleared afterwards)
+        page_numbers: Page numbers (1-indexed) matching images
+        
+    Returns:
+        Tuple of (extracted text for each page, completion tokens for each page)
+    """
+    logger.info(f"🔍 Processing pages {page_numbers[0]}-{page_numbers[-1]} ({len(images)} pages)")
+    if vllm_engine is not None:
+        texts, token_counts = await run_ocr_on_images_vllm(images)
+    else:
+        async with GPU_SEM:
+            texts, token_counts = await asyncio.get_running_loop().run_in_executor(
+                GPU_EXECUTOR, run_ocr_on_images, images
+            )
+    images.clear()  # Release page pixels before the next renders
+    
+    for page_num, text in zip(page_numbers, texts):
+        logger.info(f"✅ Page {page_num} completed ({len(text)} chars)")
+    
+    return texts, token_counts
+
+
+@asynccontextmanager
+async def _rendered_pages(pdf_bytes: bytes, max_pending: int, **render_options):
+    """
+    Renders and filters a PDF in a background thread, feeding an asyncio queue.
+    
+    pdf_processor.iter_pages() runs in a dedicated thread and hands each item to
+    the event loop through a bounded queue, so rendering runs ahead of the
+    consumer by at most max_pending pages. Queue items are the
+    (image, page_number, stats) tuples of iter_pages(), then None at the end
+    of the document; a rendering error is put in the queue as the exception
+    instance, to be re-raised by the consumer.
+    
+    On exit (also on error or cancelled request) the render thread is
+    stopped and the document closed before returning.
+    
+    Every document gets its own thread rather than a slot of asyncio's
+    default pool: the thread blocks on the queue for as long as OCR is
+    behind, and enough concurrent documents would otherwise hold every slot
+    of a shared pool while waiting for OCR calls that need one.
+    
+    Args:
+        pdf_bytes: PDF file content as bytes
+        max_pending: Maximum number of rendered pages waiting in the queue
+        **render_options: Keyword arguments for pdf_processor.iter_pages()
+        
+    Yields:
+        asyncio.Queue of rendered pages
+    """
+    loop = asyncio.get_running_loop()
+    pages = asyncio.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    rendered = loop.create_future()  # Done when the render thread has returned
+    
+    def render() -> None:
+        # Runs in a worker thread: blocks on the queue when the consumer falls behind
+        def put(item) -> None:
+            asyncio.run_coroutine_threadsafe(pages.put(item), loop).result()
+        
+        try:
+            # Pages stay RGB arrays: the processor takes them without a PIL round-trip
+            page_iter = pdf_processor.iter_pages(pdf_bytes, as_array=True, **render_options)
+            with closing(page_iter):
+                for item in page_iter:
+                    if stop.is_set():
+                        return  # Consumer gave up: stop rendering
+                    put(item)
+        except Exception as e:
+            if not stop.is_set():
+                put(e)  # Re-raised by the consumer
+            return
+        
+        if not stop.is_set():
+            put(None)  # End of document
+    
+    def run() -> None:
+        try:
+            render()
+        finally:
+            loop.call_soon_threadsafe(rendered.set_result, None)
+    
+    threading.Thread(target=run, name="pdf-render", daemon=True).start()
+    
+    try:
+        yield pages
+    finally:
+        # On early exit the render thread may be blocked on a full queue:
+        # stop it, unblock it, and wait until it has closed the document
+        stop.set()
+        while not pages.empty():
+            pages.get_nowait()
+        await asyncio.shield(rendered)
+
+
+async def _ocr_document(
+    pdf_bytes: bytes,
+    **render_options
+) -> Tuple[List[str], List[int], List[dict], int, int]:
+    """
+    Renders, filters and recognizes a PDF as a two-stage pipeline.
+    
+    Stage 1 (render thread, see _rendered_pages): pages are rasterized and
+    blank ones dropped. Stage 2 (this coroutine): pages are grouped into
+    mini-batches of up to OCR_BATCH_SIZE and recognized by _ocr_batch().
+    A batch is dispatched when it is full, or OCR_BATCH_TIMEOUT_MS after its
+    first page arrived, so the GPU never waits long for a slow render.
+    Meanwhile the render thread keeps working on the next pages: wall time
+    approaches the slower stage instead of the sum of both. The event loop
+    stays free for other requests.
+    
+    Args:
+        pdf_bytes: PDF file content as bytes
+        **render_options: Keyword arguments for pdf_processor.iter_pages()
+        
+    Returns:
+        Tuple containing:
+            - Extracted text for each page with content, in page order
+            - Page numbers (1-indexed) of the pages with content
+            - Statistics dictionaries of every analyzed page
+            - Total number of pages in the PDF
+            - Total number of generated (completion) tokens
+            
+    Raises:
+        ValueError: If the PDF cannot be processed
+        HTTPException: If OCR processing fails
+    """
+    loop = asyncio.get_running_loop()
+    
+    ocr_results = []
+    page_numbers = []  # Pages with content (1-indexed)
+    page_stats = []  # Detailed statistics for every analyzed page
+    total_pages = 0
+    completion_tokens = 0
+    batch = []  # Pages waiting for OCR
+    batch_timeout = OCR_BATCH_TIMEOUT_MS / 1000.0
+    next_page = None  # Pending queue read, kept across batch timeouts
+    
+    async with _rendered_pages(pdf_bytes, 2 * OCR_BATCH_SIZE, **render_options) as pages:
+        try:
+            finished = False
+            while not finished:
+                deadline = None  # Set when the first page of the batch arrives
+                
+                while len(batch) < OCR_BATCH_SIZE:
+                    if next_page is None and not pages.empty():
+                        item = pages.get_nowait()  # Already rendered: no wait
+                    else:
+                        if next_page is None:
+                            next_page = asyncio.ensure_future(pages.get())
+                        
+                        if deadline is not None:
+                            # A timed-out read stays pending, so no page is ever lost
+                            await asyncio.wait({next_page}, timeout=max(0.0, deadline - loop.time()))
+                            if not next_page.done():
+                                break  # Dispatch the partial batch
+                        
+                        item = await next_page
+                        next_page = None
+                    
+                    if item is None:
+                        finished = True
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    
+                    image, page_num, stats = item
+                    total_pages += 1
+                    if stats is not None:
+                        page_stats.append(stats)
+                    if image is None:
+                        continue  # Blank page
+                    
+                    page_numbers.append(page_num)
+                    batch.append(image)
+                    if deadline is None:
+                        deadline = loop.time() + batch_timeout
+                
+                if batch:
+                    texts, token_counts = await _ocr_batch(batch, page_numbers[-len(batch):])
+                    ocr_results.extend(texts)
+                    completion_tokens += sum(token_counts)
+        
+        finally:
+            # Must not consume a page while the queue is being drained
+            if next_page is not None:
+                next_page.cancel()
+    
+    return ocr_results, page_numbers, page_stats, total_pages, completion_tokens
+
+
+async def _stream_chat_completion(pdf_bytes: bytes, model_name: str) -> AsyncIterator[str]:
+    """
+    Recognizes a PDF page by page, streaming the Markdown as it is generated.
+    
+    Yields OpenAI-compatible "chat.completion.chunk" Server-Sent Events. The
+    content is the same document images_to_markdown() builds: page separator
+    and page comment first, then the page text as it is decoded. Pages are
+    generated one at a time (streaming is per sequence), while the next
+    pages keep rendering in the background.
+    
+    Args:
+        pdf_bytes: PDF file content as bytes
+        model_name: Model name echoed in the chunks
+        
+    Yields:
+        SSE lines ("data: {...}\n\n"), ending with "data: [DONE]\n\n"
+    """
+    completion_id = f"chatcmpl-{int(time.time())}"
+    created = int(time.time())
+    
+    def chunk(delta: dict, finish_reason: Optional[str] = None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model_name,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+    
+    yield chunk({"role": "assistant", "content": ""})
+    
+    pages_processed = 0
+    try:
+        async with _rendered_pages(
+            pdf_bytes,
+            2,  # Pages rendered ahead of the page being generated
+            skip_blank=True,  # Always skip blank pages for efficiency
+            full_stats=False,  # Page stats are not returned here: allow early exit
+            max_size=MAX_IMAGE_SIZE  # Rendered at OCR size: no resize pass
+        ) as pages:
+            while True:
+                item = await pages.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                
+                image, page_num, _ = item
+                if image is None:
+                    continue  # Blank page
+                
+                # Same layout as images_to_markdown(): separator between pages,
+                # page comment, then the stripped page text
+                header = PAGE_SEPARATOR if pages_processed > 0 else ""
+                pages_processed += 1
+                yield chunk({"content": f"{header}<!-- Page {pages_processed} -->\n\n"})
+                
+                logger.info(f"🔍 Streaming page {page_num}")
+                leading = True
+                trailing = ""  # Whitespace held back until more text follows
+                # aclosing(): stop generation right away if the client disconnects
+                async with aclosing(stream_ocr_on_image(image)) as texts:
+                    async for text in texts:
+                        if leading:
+                            text = text.lstrip()
+                            if not text:
+                                continue
+                            leading = False
+                        
+                        stripped = text.rstrip()
+                        if stripped:
+                            yield chunk({"content": trailing + stripped})
+                            trailing = text[len(stripped):]
+                        else:
+                            trailing += text
+                del image  # Release page pixels before the next page
+        
+        logger.info(f"✅ Streamed {pages_processed} pages")
+        yield chunk({}, finish_reason="stop")
+        
+    except Exception as e:
+        # Headers are already sent: report the error in the stream
+        logger.error(f"❌ Streaming error: {e}")
+        yield f"data: {json.dumps({'error': {'message': str(e)}})}\n\n"
+    
+    yield "data: [DONE]\n\n"
+
+
 @app.post("/ocr")
 async def ocr_endpoint(file: UploadFile = File(...), skip_blank: bool = True):
     """
@@ -296,34 +1107,22 @@ async def ocr_endpoint(file: UploadFile = File(...), skip_blank: bool = True):
         pdf_bytes = await file.read()
         logger.info(f"📄 Received PDF: {file.filename} ({len(pdf_bytes)} bytes)")
         
-        # Convert PDF to images (with blank page filter)
-        # Returns: images, page numbers (1-indexed), and detailed statistics
-        images, page_numbers, page_stats = pdf_processor.pdf_to_images(
-            pdf_bytes, 
-            skip_blank=skip_blank
+        # Render/filter pages in a background thread while earlier pages are
+        # recognized on the GPU (pages are released after OCR, so with the
+        # render cache disabled memory does not grow with page count)
+        ocr_results, page_numbers, page_stats, total_pages, _ = await _ocr_document(
+            pdf_bytes,
+            skip_blank=skip_blank,
+            max_size=MAX_IMAGE_SIZE  # Rendered at OCR size: no resize pass
         )
         
-        total_pages = len(page_stats) if page_stats else len(images)
-        skipped_pages = total_pages - len(images)
+        skipped_pages = total_pages - len(page_numbers)
         
         logger.info(
-            f"🖼️  Extracted {len(images)}/{total_pages} pages "
+            f"🖼️  Extracted {len(page_numbers)}/{total_pages} pages "
             f"(skipped {skipped_pages})"
         )
         
-        # Run OCR on each page with content
-        ocr_results = []
-        for idx, (image, page_num) in enumerate(zip(images, page_numbers), start=1):
-            logger.info(f"🔍 Processing page {page_num} ({idx}/{len(images)})")
-            
-            # Optimize image for OCR (resize if too large)
-            optimized_image = pdf_processor.optimize_image_for_ocr(image)
-            
-            # Run OCR
-            text = run_ocr_on_image(optimized_image)
-            ocr_results.append(text)
-            logger.info(f"✅ Page {page_num} completed ({len(text)} chars)")
-        
         # Convert to Markdown format
         markdown_text = images_to_markdown(ocr_results)
         
@@ -339,7 +1138,7 @@ async def ocr_endpoint(file: UploadFile = File(...), skip_blank: bool = True):
         return {
             "success": True,
             "pages_total": total_pages,
-            "pages_processed": len(images),
+            "pages_processed": len(page_numbers),
             "pages_skipped": skipped_pages,
             "skipped_pages": skipped_page_numbers,
             "processed_pages": page_numbers,
@@ -372,9 +1171,14 @@ async def chat_completions(request: ChatCompletionRequest):
             }
         ],
         "temperature": 0.0,
-        "max_tokens": 2048
+        "max_tokens": 2048,
+        "stream": false
     }
     
+    With "stream": true the Markdown is returned as Server-Sent Events
+    ("chat.completion.chunk" objects, then "data: [DONE]") while it is
+    generated.
+    
     Response format (OpenAI-compatible):
     {
         "id": "chatcmpl-<timestamp>",
@@ -391,7 +1195,7 @@ async def chat_completions(request: ChatCompletionRequest):
         }],
         "usage": {
             "prompt_tokens": <estimated>,
-            "completion_tokens": <word_count>,
+            "completion_tokens": <generated_tokens>,
             "total_tokens": <sum>
         }
     }
@@ -405,39 +1209,41 @@ async def chat_completions(request: ChatCompletionRequest):
         content = user_message.content
         
         # Verify it's a base64-encoded PDF
-        if not content.startswith("data:application/pdf;base64,"):
+        if not content.startswith(PDF_DATA_URI_PREFIX):
             raise HTTPException(
                 status_code=400,
                 detail="Content must be a base64-encoded PDF (data:application/pdf;base64,...)"
             )
         
-        # Decode base64 PDF
-        base64_data = content.split(",", 1)[1]  # Remove data URI prefix
-        pdf_bytes = base64.b64decode(base64_data)
+        # Decode base64 PDF (one slice past the known prefix: split() would
+        # also scan the whole payload and build a list around the copy)
+        base64_data = content[len(PDF_DATA_URI_PREFIX):]
+        pdf_bytes = base64.b64decode(base64_data, validate=False)
+        del base64_data  # Don't hold the copy for the whole OCR run
         logger.info(f"📄 Received PDF via OpenAI API ({len(pdf_bytes)} bytes)")
         
-        # Convert PDF to images (with blank page filter enabled)
-        images, page_numbers, page_stats = pdf_processor.pdf_to_images(
-            pdf_bytes, 
-            skip_blank=True  # Always skip blank pages for efficiency
-        )
+        # Streaming: Server-Sent Events with the Markdown as it is generated
+        if request.stream:
+            return StreamingResponse(
+                _stream_chat_completion(pdf_bytes, request.model),
+                media_type="text/event-stream"
+            )
         
-        total_pages = len(page_stats) if page_stats else len(images)
-        logger.info(f"🖼️  Extracted {len(images)}/{total_pages} pages")
+        # Render/filter and OCR pages in an overlapped pipeline (with blank page filter enabled)
+        ocr_results, _, _, total_pages, completion_tokens = await _ocr_document(
+            pdf_bytes,
+            skip_blank=True,  # Always skip blank pages for efficiency
+            full_stats=False,  # Page stats are not returned here: allow early exit
+            max_size=MAX_IMAGE_SIZE  # Rendered at OCR size: no resize pass
+        )
         
-        # Run OCR on each page with content
-        ocr_results = []
-        for idx, (image, page_num) in enumerate(zip(images, page_numbers), start=1):
-            logger.info(f"🔍 Processing page {page_num} ({idx}/{len(images)})")
-            optimized_image = pdf_processor.optimize_image_for_ocr(image)
-            text = run_ocr_on_image(optimized_image)
-            ocr_results.append(text)
+        pages_processed = len(ocr_results)
+        logger.info(f"🖼️  Extracted {pages_processed}/{total_pages} pages")
         
         # Convert to Markdown format
         markdown_text = images_to_markdown(ocr_results)
         
         # Build OpenAI-compatible response
-        import time
         response = {
             "id": f"chatcmpl-{int(time.time())}",  # Unique completion ID
             "object": "chat.completion",
@@ -454,9 +1260,9 @@ async def chat_completions(request: ChatCompletionRequest):
                 }
             ],
             "usage": {
-                "prompt_tokens": len(images) * 100,  # Estimate: ~100 tokens per image
-                "completion_tokens": len(markdown_text.split()),  # Word count
-                "total_tokens": len(images) * 100 + len(markdown_text.split())
+                "prompt_tokens": pages_processed * 100,  # Estimate: ~100 tokens per image
+                "completion_tokens": completion_tokens,  # Generated tokens (all pages)
+                "total_tokens": pages_processed * 100 + completion_tokens
             }
         }
         
@@ -470,15 +1276,22 @@ async def chat_completions(request: ChatCompletionRequest):
 
 
 if __name__ == "__main__":
+    # Prefer the uvicorn CLI (see Dockerfile): PDF render worker processes are
+    # spawned and re-import the main module, which would then be this file
+    # (torch, transformers and the app) instead of uvicorn
+    
     # Get port from environment (Cloud Run sets PORT automatically)
     port = int(os.environ.get("PORT", 8080))
     
     # Run uvicorn server
     # host="0.0.0.0" allows external connections (required for Cloud Run)
+    # A single worker: the model is loaded once per process and owns the GPU
     uvicorn.run(
         app,
         host="0.0.0.0",  # Listen on all network interfaces
         port=port,
+        loop="uvloop",  # libuv event loop (installed with uvicorn[standard])
+        http="httptools",  # C HTTP parser, cheaper on large uploads
         log_level="info",  # INFO level logging
         access_log=True  # Log all HTTP requests
     )